@@ -12,7 +12,6 @@ setup(
     license="MIT",
     packages=find_packages(),
     install_requires=[
-        "pandas",
         "graphviz",
     ],
     python_requires=">=3.6",
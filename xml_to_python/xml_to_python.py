@@ -1,70 +1,61 @@
+import functools
+import hashlib
+import io
 import keyword
 import os
-import uuid
+import re
+import sys
 import xml.etree.ElementTree as ET
-from collections import defaultdict
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
 
 import graphviz
 
+_KEYWORDS = frozenset(keyword.kwlist)
+_INVALID_NAME_CHARS = re.compile(r"\W")  # Anything but letters, digits and underscores
+_PARALLEL_WRITE_THRESHOLD = 16  # Minimum number of class modules written with a thread pool
+_WRITE_WORKERS = 8
+
+# Templates for the generated instance code, %-formatted once per line
+_INSTANCE_NAME_TMPL = "%s_%x"
+_STR_TMPL = "'%s'"
+_CREATE_TMPL = "%s = %s()\n"
+_ASSIGN_STR_TMPL = "%s.%s = '%s'\n"
+_ASSIGN_TMPL = "%s.%s = %s%s\n"
+_APPEND_TMPL = "%s.%s.append(%s%s)\n"
+
 
 def escape_string(value: str) -> str:
     """Escape problematic characters in strings."""
     if not value:
         return None
+    if not ("\\" in value or "'" in value or "\n" in value or "\r" in value):
+        return value  # Most values need no escaping; each check is a single C-level scan
     return value.replace("\\", "\\\\").replace("'", "\\'").replace("\n", "\\n").replace("\r", "\\r")
 
 
+@functools.lru_cache(maxsize=None)
 def sanitize(name: str) -> str:
     """Sanitize names by removing namespaces and replacing invalid characters."""
     if "}" in name:
         name = name.split("}")[-1]  # Remove namespace
-    sanitized_name = ''.join(char if char.isalnum() or char == '_' else '_' for char in name)
-    if sanitized_name in keyword.kwlist:  # If sanitized name is a Python keyword
+    sanitized_name = _INVALID_NAME_CHARS.sub('_', name)
+    if sanitized_name in _KEYWORDS:  # If sanitized name is a Python keyword
         sanitized_name += '_'  # Add an underscore to avoid conflict
-    return sanitized_name
-
-
-def analyze_structure(root: ET.Element):
-    """Analyze the structure of the XML to determine element and attribute counts."""
-    element_counts = defaultdict(int)
-    potential_fields = defaultdict(set)
-
-    def count_elements(element: ET.Element, parent_name: str = None):
-        class_name = sanitize(element.tag).capitalize()
-
-        # Count child elements
-        for child in element:
-            key = (class_name, sanitize(child.tag.lower()))
-            element_counts[key] = max(element_counts[key], len(list(filter(lambda x: x.tag == child.tag, element))))
-            potential_fields[class_name].add(sanitize(child.tag.lower()))
+    return sys.intern(sanitized_name)  # Names repeat across elements and key many dicts
 
-        # Count attributes
-        for attr in element.attrib:
-            key = (class_name, sanitize(attr))
-            attr_count = sum(1 for _ in element.attrib if _ == attr)
-            element_counts[key] = max(element_counts[key], attr_count)
-            potential_fields[class_name].add(sanitize(attr))
 
-        # Recurse into child elements
-        for child in element:
-            count_elements(child, class_name)
+@functools.lru_cache(maxsize=None)
+def tag_to_class_name(tag: str) -> str:
+    """Get the class name generated for an XML tag."""
+    return sys.intern(sanitize(tag).capitalize())
 
-    count_elements(root)
-
-    return element_counts, potential_fields
-
-
-def has_only_text(class_name: str, element_counts: dict, potential_fields: dict) -> bool:
-    """Check if a class has only text and no attributes or child elements."""
-    if not potential_fields.get(class_name):
-        return True  # No attributes or child elements
-    return False
 
-
-def has_no_attributes(class_name: str, potential_fields: dict) -> bool:
-    """Check if a class has no attributes."""
-    fields = potential_fields.get(class_name, set())
-    return all(field.islower() for field in fields)  # Assuming attributes are lowercase
+@functools.lru_cache(maxsize=None)
+def tag_to_field_name(tag: str) -> str:
+    """Get the field name under which an XML tag is stored in its parent class."""
+    return sys.intern(sanitize(tag.lower()))
 
 
 def is_single_instance(class_name: str, field: str, element_counts: dict) -> bool:
@@ -73,9 +64,15 @@ def is_single_instance(class_name: str, field: str, element_counts: dict) -> boo
     return element_counts[key] <= 1
 
 
-def is_class_field(class_name: str, field: str, potential_fields: dict) -> bool:
+@functools.lru_cache(maxsize=None)
+def field_to_class_name(field: str) -> str:
+    """Get the class name a field refers to if it holds instances of another class."""
+    return sys.intern(field.capitalize())
+
+
+def is_class_field(field: str, potential_fields: dict) -> bool:
     """Check if a field of a class represents another class."""
-    return field.capitalize() in potential_fields
+    return field_to_class_name(field) in potential_fields
 
 
 def define_class(class_name: str, potential_fields: dict, element_counts: dict) -> str:
@@ -86,8 +83,8 @@ def define_class(class_name: str, potential_fields: dict, element_counts: dict)
     lines.append("    def __init__(self):")
     lines.append("        super().__init__()")
 
-    for field in potential_fields.get(class_name, []):
-        if is_class_field(class_name, field, potential_fields):
+    for field in sorted(potential_fields.get(class_name, [])):  # Stable order keeps regenerated files identical
+        if is_class_field(field, potential_fields):
             if not is_single_instance(class_name, field, element_counts):
                 lines.append(f"        self.{field} = []  # List of instances")
             else:
@@ -101,146 +98,214 @@ def define_class(class_name: str, potential_fields: dict, element_counts: dict)
     lines.append("")
     lines.append("    @classmethod")
     lines.append("    def to_csv(cls):")
-    lines.append("        data = [vars(instance) for instance in cls.instances]")
-    lines.append(f"        pd.DataFrame(data).to_csv('{class_name}.csv', index=False)")
+    lines.append("        fields = list(dict.fromkeys(")
+    lines.append("            field for instance in cls.instances for field in vars(instance)")
+    lines.append("        ))")
+    lines.append(f"        with open('{class_name}.csv', 'w', encoding='utf-8', newline='') as file:")
+    lines.append("            writer = csv.DictWriter(file, fields)")
+    lines.append("            writer.writeheader()")
+    lines.append("            writer.writerows(vars(instance) for instance in cls.instances)")
     lines.append("")
     return "\n".join(lines)
 
 
 def generate_instance(
-        element: ET.Element,
-        parent: str,
         class_name: str,
         attributes: dict,
         element_text: str,
-        element_counts: dict,
-        potential_fields: dict,
-        instances: list,
-        defined_classes: set
-):
-    """Generate an instance of a class and recursively handle child elements."""
-    # Handle elements with only text (no attributes or children)
-    if not attributes and not list(element) and element_text:
-        return f"'{escape_string(element_text)}'"
-
-    # Handle elements with no attributes, text, or children
-    if not attributes and not list(element) and not element_text:
-        return "True"  # Indicate presence as a boolean
-
-    # Define class if not already defined
-    if class_name not in defined_classes:
-        defined_classes.add(class_name)
-        define_class_code = define_class(class_name, potential_fields, element_counts)
-        with open(f"generated_code/{class_name.lower()}.py", "w", encoding="utf-8") as file:
-            file.write(f"from base_model import BaseModel\nimport pandas as pd\n\n{define_class_code}")
+        instances: io.StringIO,
+        defined_classes: set,
+        instance_ids: count
+) -> str:
+    """Generate an instance of a class; child elements are linked to it separately."""
+    defined_classes.add(class_name)
 
     # Create instance
-    instance_name = f"{class_name.lower()}_{uuid.uuid4().hex[:8]}"
-    instances.append(f"{instance_name} = {class_name}()")
+    instance_name = _INSTANCE_NAME_TMPL % (class_name.lower(), next(instance_ids))
+    instances.write(_CREATE_TMPL % (instance_name, class_name))
 
     # Add attributes to the instance
     for attr, value in attributes.items():
         escaped_value = escape_string(value)
-        instances.append(f"{instance_name}.{attr} = '{escaped_value}'")
+        instances.write(_ASSIGN_STR_TMPL % (instance_name, attr, escaped_value))
 
     # Add text if it exists
     if element_text:
         escaped_text = escape_string(element_text)
-        instances.append(f"{instance_name}.text = '{escaped_text}'")
-
-    # Process child elements
-    for sub_elem in element:
-        sub_instance_or_text, is_class = parse_element(
-            sub_elem, element_counts, potential_fields, instances, defined_classes
-        )
-        sub_elem_name = sanitize(sub_elem.tag.lower())
-        key = (class_name, sub_elem_name)
-        if element_counts[key] > 1:
-            instances.append(
-                f"{instance_name}.{sub_elem_name}.append({sub_instance_or_text}{'.uuid' if is_class else ''})")
-        else:
-            instances.append(f"{instance_name}.{sub_elem_name} = {sub_instance_or_text}{'.uuid' if is_class else ''}")
+        instances.write(_ASSIGN_STR_TMPL % (instance_name, "text", escaped_text))
 
     return instance_name
 
 
 def parse_element(
         element: ET.Element,
+        child_counts: Counter,
+        child_results: list,
         element_counts: dict,
         potential_fields: dict,
-        instances: list,
-        defined_classes: set
+        instances: io.StringIO,
+        links: list,
+        defined_classes: set,
+        instance_ids: count
 ):
-    """Parse an XML element and generate Python code dynamically."""
-    class_name = sanitize(element.tag).capitalize()
+    """Parse an XML element whose children have already been parsed and generate Python code for it."""
+    class_name = tag_to_class_name(element.tag)
     attributes = {sanitize(k): v for k, v in element.attrib.items()}
-    sub_elements = list(element)
-    element_text = element.text.strip() if element.text and element.text.strip() else None
+    element_text = element.text.strip() or None if element.text else None
+
+    # Count child elements
+    for child_tag, child_count in child_counts.items():
+        field = tag_to_field_name(child_tag)
+        key = (class_name, field)
+        element_counts[key] = max(element_counts[key], child_count)
+        potential_fields[class_name].add(field)
+
+    # Count attributes; attribute names are unique within an element
+    for attr in attributes:
+        key = (class_name, attr)
+        element_counts[key] = max(element_counts[key], 1)
+        potential_fields[class_name].add(attr)
 
     # Handle elements with only text
-    if not attributes and not sub_elements and element_text:
-        return f"'{escape_string(element_text)}'", False
+    if not attributes and not child_counts and element_text:
+        return _STR_TMPL % escape_string(element_text), False
 
     # Handle elements with no attributes, text, or children
-    if not attributes and not sub_elements and not element_text:
+    if not attributes and not child_counts and not element_text:
         return "False", False  # Indicate absence as a boolean
 
-    return generate_instance(
-        element, None, class_name, attributes, element_text, element_counts, potential_fields, instances,
-        defined_classes
-    ), True
+    instance_name = generate_instance(
+        class_name, attributes, element_text, instances, defined_classes, instance_ids
+    )
+
+    # Link child elements; whether a field holds a list is only known once the whole document is read
+    for sub_elem_name, sub_instance_or_text, is_class in child_results:
+        links.append((instance_name, class_name, sub_elem_name, sub_instance_or_text, ".uuid" if is_class else ""))
+
+    return instance_name, True
+
+
+def parse_xml(xml_file: str, instances: io.StringIO, defined_classes: set):
+    """
+    Stream the XML file, analyzing its structure and generating instance code in a single pass.
+
+    Elements are cleared as soon as they have been processed, so the whole document is never held in memory.
+    """
+    element_counts = defaultdict(int)
+    potential_fields = defaultdict(set)
+    links = []
+    instance_ids = count()  # Suffixes keeping instance variable names unique
+
+    # Each frame holds an open element with the tag counts and parse results of its direct children
+    stack = []
+    for event, element in ET.iterparse(xml_file, events=("start", "end")):
+        if event == "start":
+            if stack:
+                stack[-1][1][element.tag] += 1
+            stack.append((element, Counter(), []))
+            continue
+
+        _, child_counts, child_results = stack.pop()
+        sub_instance_or_text, is_class = parse_element(
+            element, child_counts, child_results, element_counts, potential_fields, instances, links,
+            defined_classes, instance_ids
+        )
+        element.clear()
+        if stack:
+            parent, _, parent_results = stack[-1]
+            parent_results.append((tag_to_field_name(element.tag), sub_instance_or_text, is_class))
+            # Detach the previous finished sibling; the element itself stays attached until its tail text is parsed
+            while parent[0] is not element:
+                del parent[0]
+
+    for instance_name, class_name, sub_elem_name, sub_instance_or_text, suffix in links:
+        key = (class_name, sub_elem_name)
+        template = _APPEND_TMPL if element_counts[key] > 1 else _ASSIGN_TMPL
+        instances.write(template % (instance_name, sub_elem_name, sub_instance_or_text, suffix))
+
+    return element_counts, potential_fields
+
+
+def generate_class_files(defined_classes: set, potential_fields: dict, element_counts: dict) -> dict:
+    """Generate the source code of each class module, keyed by class name."""
+    class_files = {}
+    for class_name in defined_classes:
+        define_class_code = define_class(class_name, potential_fields, element_counts)
+        class_files[class_name] = f"from base_model import BaseModel\nimport csv\n\n{define_class_code}"
+    return class_files
+
+
+def write_class_file(path: str, class_code: str, exists: bool):
+    """Write a class module, skipping the write if the file already holds the same code."""
+    header = f"# hash: {hashlib.blake2b(class_code.encode('utf-8'), digest_size=8).hexdigest()}\n"
+    if exists:
+        with open(path, encoding="utf-8") as file:
+            if file.readline() == header:
+                return
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(header + class_code)
+
+
+def write_class_files(output_dir: str, class_files: dict):
+    """Write every generated class module to the output directory."""
+    existing_files = {entry.name for entry in os.scandir(output_dir) if entry.is_file()}
+
+    def write(item):
+        class_name, class_code = item
+        file_name = f"{class_name.lower()}.py"
+        write_class_file(os.path.join(output_dir, file_name), class_code, file_name in existing_files)
+
+    # File writes release the GIL, but a pool is not worth starting for a handful of classes
+    if len(class_files) < _PARALLEL_WRITE_THRESHOLD:
+        for item in class_files.items():
+            write(item)
+    else:
+        with ThreadPoolExecutor(max_workers=_WRITE_WORKERS) as executor:
+            list(executor.map(write, class_files.items()))
 
 
 def generate_python_code(xml_file: str, output_dir: str = "generated_code", generate_graph: bool = True):
     """Generate Python classes and a main script from an XML file."""
-    try:
-        tree = ET.parse(xml_file)
-        root = tree.getroot()
-
-        # Analyze the XML structure
-        element_counts, potential_fields = analyze_structure(root)
-
-        os.makedirs(output_dir, exist_ok=True)
-
-        # Define BaseModel class
-        base_model_path = os.path.join(output_dir, "base_model.py")
-        with open(base_model_path, "w", encoding="utf-8") as file:
-            file.write(
-                "\n".join([
-                    "import pandas as pd",
-                    "import uuid",
-                    "",
-                    "class BaseModel:",
-                    "    instances = []",
-                    "",
-                    "    def __init__(self):",
-                    "        self.uuid = str(uuid.uuid4())",
-                    "        self.__class__.instances.append(self)",
-                    "",
-                ])
-            )
-
-        # Generate classes and main script
-        defined_classes = set()
-        instances = []
-        parse_element(root, element_counts, potential_fields, instances, defined_classes)
-
-        # Generate main script
-        main_script_path = os.path.join(output_dir, "generated_main.py")
-        with open(main_script_path, "w", encoding="utf-8") as file:
-            imports = "\n".join([f"from {cls.lower()} import {cls}" for cls in defined_classes])
-            file.write(f"{imports}\n\n# Instances\n")
-            file.write("\n".join(instances))
-            file.write("\n\n# Save all instances to CSV\n")
-            file.write("\n".join([f"{cls}.to_csv()" for cls in defined_classes]))
-
-        if generate_graph:
-            generate_dependency_graph(output_dir, potential_fields)
-
-        print("Python code has been generated and saved to", output_dir)
+    # Analyze the XML structure and generate instances
+    defined_classes = set()
+    instances = io.StringIO()
+    element_counts, potential_fields = parse_xml(xml_file, instances, defined_classes)
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Define BaseModel class
+    base_model_path = os.path.join(output_dir, "base_model.py")
+    with open(base_model_path, "w", encoding="utf-8") as file:
+        file.write(
+            "\n".join([
+                "import uuid",
+                "",
+                "class BaseModel:",
+                "    instances = []",
+                "",
+                "    def __init__(self):",
+                "        self.uuid = str(uuid.uuid4())",
+                "        self.__class__.instances.append(self)",
+                "",
+            ])
+        )
 
-    except Exception as e:
-        print(f"Error: {e}")
+    # Define classes
+    class_files = generate_class_files(defined_classes, potential_fields, element_counts)
+    write_class_files(output_dir, class_files)
+
+    # Generate main script
+    main_script_path = os.path.join(output_dir, "generated_main.py")
+    main_script = [f"from {cls.lower()} import {cls}" for cls in defined_classes]
+    main_script += ["", "# Instances", instances.getvalue(), "# Save all instances to CSV"]
+    main_script += [f"{cls}.to_csv()" for cls in defined_classes]
+    with open(main_script_path, "w", encoding="utf-8", buffering=1 << 20) as file:
+        file.write("\n".join(main_script))
+
+    if generate_graph:
+        generate_dependency_graph(output_dir, potential_fields)
+
+    print("Python code has been generated and saved to", output_dir)
 
 
 def generate_dependency_graph(output_dir: str, potential_fields: dict):
@@ -255,10 +320,19 @@ def generate_dependency_graph(output_dir: str, potential_fields: dict):
         graph.node(class_name, class_name)  # Add class as a node
         for field in fields:
             # If the field is a reference to another class, add an edge
-            if field.capitalize() in potential_fields:
-                graph.edge(class_name, field.capitalize())
+            if is_class_field(field, potential_fields):
+                graph.edge(class_name, field_to_class_name(field))
 
     # Save and render the graph
     graph_path = os.path.join(output_dir, "class_dependencies")
     graph.render(graph_path)
     print(f"Dependency graph saved as PDF at {graph_path}.pdf")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit(f"Usage: python {sys.argv[0]} XML_FILE [OUTPUT_DIR]")
+    try:
+        generate_python_code(*sys.argv[1:3])
+    except Exception as e:
+        sys.exit(f"Error: {e}")